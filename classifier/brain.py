@@ -1,13 +1,32 @@
 import zmq
+import zmq.asyncio
+import asyncio
+import msgpack
 import os
 import json
+import orjson
 import time
-from ocr import ocr_extract
-from llm import classifyUsingLLMClassification
-from rag import process_and_store_embeddings
+from ocr import prefetch_files, OCR_PROCESSES
+from extract import extract_content, get_extension, ocr_extensions
 import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import ahocorasick
+except ImportError:
+    print("[Brain] Warning: 'pyahocorasick' not found. Falling back to per-keyword search.")
+    ahocorasick = None
 
 IPC_ADDRESS = "ipc:///tmp/magic_brain.ipc"
+
+# OCR workers must not be forked from the server: by then it runs zmq, RAG and LLM
+# threads whose locks a forked child could inherit held. Workers still import this
+# script as __mp_main__, which is why llm and rag are only imported when first used.
+OCR_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_ocr_pool = None
 #need to get file as well as data
 # analyze file using llm and put down into specific categories
 categories=['Screenshots','Invoices','TrainTickers','IDProofs','Misc',"Notes","Credentials","Resume","Audio","Video","Archives"]
@@ -15,233 +34,271 @@ categories=['Screenshots','Invoices','TrainTickers','IDProofs','Misc',"Notes","C
 #                      ↓ (uncertain)
 #                   LLM Classification
 
-    # Readable text files
-text_extensions = [
-        '.txt', '.md', '.csv', '.json', '.xml', '.html', '.css', '.js', 
-        '.py', '.cpp', '.h', '.c', '.java', '.sh', '.yaml', '.yml', 
-        '.ini', '.conf', '.log'
-    ]
-    
-    # OCR candidates
-ocr_extensions = ['.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.pdf']
+# Shorter content is too little for the LLM to go on; longer content is truncated
+LLM_MIN_CONTENT_LENGTH = 30
+LLM_CONTENT_LIMIT = 4000
+
+# Extensions that decide the category on their own, without looking at content
+EXT_TO_CATEGORY = {
+    '.mp3': 'Audio', '.wav': 'Audio', '.flac': 'Audio',
+    '.mp4': 'Video', '.mov': 'Video', '.avi': 'Video', '.mkv': 'Video',
+    '.zip': 'Archives', '.tar': 'Archives', '.gz': 'Archives', '.rar': 'Archives',
+}
+
+# Keyword rules in priority order: the first category with a hit wins
+CATEGORY_KEYWORDS = [
+    ("TrainTickets", ["irctc", "pnr", "reservation slip", "train no", "journey date"]),
+    ("Invoices", ["invoice", "invoice no", "gstin", "total amount", "bill to", "tax invoice"]),
+    ("Marksheets", ["marksheet", "grade", "percentage", "cgpa", "semester", "university", "board of education"]),
+    ("IDProofs", ["aadhaar", "government of india", "passport", "pan card", "date of birth", "dob"]),
+    ("Credentials", ["username", "password", "api key", "secret key", "access token"]),
+    ("Notes", ["javascript", "system design", "meeting", "discussion points"]),
+]
+CATEGORY_PRIORITY = {category: rank for rank, (category, _) in enumerate(CATEGORY_KEYWORDS)}
+CATEGORY_KEYWORD_BYTES = [
+    (category, [kw.encode() for kw in keywords]) for category, keywords in CATEGORY_KEYWORDS
+]
+
+def _build_keyword_automaton():
+    automaton = ahocorasick.Automaton()
+    for category, keywords in CATEGORY_KEYWORDS:
+        for kw in keywords:
+            # Overlapping keywords ("invoice" / "invoice no") belong to the same category
+            automaton.add_word(kw, (CATEGORY_PRIORITY[category], category))
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_AUTOMATON = _build_keyword_automaton() if ahocorasick is not None else None
 
-def extract_content(filepath):
+def match_keyword_category(text):
     """
-    Extract content from file based on type.
+    Return the highest-priority category whose keywords occur in the lowercased bytes, or None.
+    Uses a single Aho-Corasick pass over the text when pyahocorasick is installed.
     """
-    if not os.path.exists(filepath):
-        return ""
-        
-    filename = os.path.basename(filepath)
-    name, ext = os.path.splitext(filename)
-    ext = ext.lower()
-    
-    content = ""
-    try:
-        if ext in text_extensions:
-            with open(filepath, 'r', errors='ignore') as f:
-                content = f.read()
-        elif ext in ocr_extensions:
-            content = ocr_extract(filepath)
-    except Exception as e:
-        print(f"[Brain] Error extracting content from {filename}: {e}")
-        
-    return content
+    if KEYWORD_AUTOMATON is not None:
+        best = None
+        # Keywords are ASCII, so a latin-1 view (a plain byte copy) matches exactly as the UTF-8 bytes would
+        for _, (rank, category) in KEYWORD_AUTOMATON.iter(text.decode('latin-1')):
+            if best is None or rank < best[0]:
+                best = (rank, category)
+                if rank == 0:
+                    break
+        return best[1] if best else None
+
+    for category, keywords in CATEGORY_KEYWORD_BYTES:
+        if any(kw in text for kw in keywords):
+            return category
+    return None
 
 def classifyUsingHeuristicClassification(filepath, content=None):
     """
     Analyze the file and return a category.
     Currently uses simple extension-based rules.
     """
-    filename = os.path.basename(filepath)
-    name, ext = os.path.splitext(filename)
-    ext = ext.lower()
-
     # Rule Engine
-    if ext in ['.mp3', '.wav', '.flac']:
-        return "Audio"
-    elif ext in ['.mp4', '.mov', '.avi', '.mkv']:
-        return "Video"
-    elif ext in ['.zip', '.tar', '.gz', '.rar']:
-        return "Archives"
+    category = EXT_TO_CATEGORY.get(get_extension(filepath))
+    if category:
+        return category
     
-    if content is not None and content != "":
+    if content:
         #create a heuristic and keyword based classification
-        text = content.lower()
-        # ---------------- Train Tickets ----------------
-        if any(
-            kw in text
-            for kw in [
-                "irctc",
-                "pnr",
-                "reservation slip",
-                "train no",
-                "journey date",
-            ]
-            ):
-            return "TrainTickets"
-        
-        # ---------------- Invoices ----------------
-        if any(kw in text for kw in [
-            "invoice",
-            "invoice no",
-            "gstin",
-            "total amount",
-            "bill to",
-            "tax invoice",]):
-            return "Invoices"
-         # ---------------- Marksheets ----------------
-        if any(
-            kw in text
-            for kw in [
-                "marksheet",
-                "grade",
-                "percentage",
-                "cgpa",
-                "semester",
-                "university",
-                "board of education",
-            ]
-        ):
-            return "Marksheets"
-        # ---------------- ID Proofs ----------------
-        if any(
-            kw in text
-            for kw in [
-                "aadhaar",
-                "government of india",
-                "passport",
-                "pan card",
-                "date of birth",
-                "dob",
-            ]
-        ):
-            return "IDProofs"
-
-          # ---------------- Credentials ----------------
-        if any(
-            kw in text
-            for kw in [
-                "username",
-                "password",
-                "api key",
-                "secret key",
-                "access token",
-            ]
-        ):
-            return "Credentials"
-        # ---------------- Notes ----------------
-        if any(
-            kw in text
-            for kw in [
-                "javascript",
-                "system design",
-                "meeting",
-                "",
-                "discussion points",
-            ]
-        ):
-            return "Notes"
+        # bytes.lower() is an ASCII-only table lookup; no decode, no Unicode case mapping
+        category = match_keyword_category(content.lower())
+        if category:
+            return category
     return "Misc"
 
-def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
+def _get_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is None:
+        # OCR is CPU-bound, so extract files in parallel across processes
+        _ocr_pool = ProcessPoolExecutor(
+            max_workers=OCR_PROCESSES,
+            mp_context=multiprocessing.get_context(OCR_START_METHOD),
+        )
+    return _ocr_pool
+
+def _shutdown_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False)
+        _ocr_pool = None
+
+async def extract_all(files):
+    """
+    Extract the content of every file on the OCR process pool.
+    A pool broken by a crashed worker is replaced so later requests still work.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_ocr_pool()
+    # Cores not taken by this request's OCR files go to page threads, so a lone PDF
+    # still uses the whole machine while a full batch stays at one thread per file
+    ocr_count = sum(1 for filepath in files if get_extension(filepath) in ocr_extensions)
+    page_threads = max(1, OCR_PROCESSES // max(1, ocr_count))
+    try:
+        return await asyncio.gather(*[
+            loop.run_in_executor(pool, extract_content, filepath, page_threads) for filepath in files
+        ])
+    except BrokenProcessPool:
+        # Concurrent requests may all see the same broken pool; replace it only once
+        if _ocr_pool is pool:
+            print("[Brain] OCR worker died; restarting the process pool")
+            _shutdown_ocr_pool()
+        raise
+
+async def handle_request(message):
+    """
+    Classify the files of one request.
+    Returns the response for the client and the input for the RAG post-processing.
+    OCR runs in the process pool and the LLM call in a thread, so the event loop
+    keeps accepting other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    files = message.get("files", [])
+    results = []
+    
+    if not files:
+        # Fallback for single file legacy request (optional, but good for robustness)
+        single_path = message.get("path")
+        if single_path:
+            files = [single_path]
+    
+    # 1. Extract content for all files
+    await loop.run_in_executor(None, prefetch_files, [fp for fp in files if get_extension(fp) in ocr_extensions])
+    contents = await extract_all(files)
+    file_contents = []
+    for filepath, content in zip(files, contents):
+        file_contents.append({"filepath": filepath, "content": content})
+    print(file_contents)
+    llmClassificationInput = []
+    # 2. Process files (Classification)
+    for item in file_contents:
+        filepath = item["filepath"]
+        content = item["content"]
+        try:
+            category = classifyUsingHeuristicClassification(filepath, content)
+            if(category == "Misc" and len(content.strip()) >= LLM_MIN_CONTENT_LENGTH):
+                llmClassificationInput.append({
+                    "filepath": filepath,
+                    "content": content[:LLM_CONTENT_LIMIT].decode('utf-8', errors='ignore'),
+                })
+            results.append({"category": category, "path": filepath})
+            print(f"[Brain] Classified '{os.path.basename(filepath)}' as: {category}")
+        except Exception as e:
+            print(f"[Brain] Error classifying {filepath}: {e}")
+            results.append({"category": "Misc", "path": filepath, "error": str(e)})
+    # 3. LLM Classification for uncertain files
+
+    print(llmClassificationInput)
+ 
+    if(len(llmClassificationInput)>0):
+        from llm import classifyUsingLLMClassification
+        llmBasedClassificationResult=await loop.run_in_executor(None, classifyUsingLLMClassification, llmClassificationInput)
+        for res in llmBasedClassificationResult:
+            filepath=res.get("filepath")
+            category=res.get("category")
+            for r in results:
+                if r["path"]==filepath:
+                    r["category"]=category
+                    print(f"[Brain] LLM Classified '{os.path.basename(filepath)}' as: {category}")
+
+    # We need to combine results with content for the RAG step
+    rag_input = []
+    for res in results:
+        path = res["path"]
+        cat = res["category"]
+        # Find content
+        content = b""
+        for item in file_contents:
+            if item["filepath"] == path:
+                content = item["content"]
+                break
+        
+        if content:
+            rag_input.append({
+                "filepath": path,
+                "content": content.decode('utf-8', errors='ignore'),
+                "category": cat
+            })
+
+    return {"results": results}, rag_input
+
+def decode_message(frame):
+    """
+    Decode a request frame. Returns (message, is_json).
+    The FUSE driver sends JSON text; Python clients send msgpack. A msgpack map never
+    starts with '{', so the first byte tells them apart.
+    """
+    if frame[:1] == b"{":
+        return orjson.loads(frame), True
+    return msgpack.unpackb(frame, raw=False), False
+
+def encode_message(message, as_json):
+    """
+    Encode a reply in the same format as the request it answers.
+    JSON replies stay on json.dumps: the FUSE driver looks for its spaced '"category": "' form.
+    """
+    if as_json:
+        return json.dumps(message).encode()
+    return msgpack.packb(message, use_bin_type=True)
+
+async def serve_request(socket, envelope, frame):
+    """
+    Handle one request from the ROUTER socket and reply to the peer in its envelope.
+    """
+    as_json = True
+    try:
+        message, as_json = decode_message(frame)
+        print(f"[Brain] Received request: {message}")
+        
+        response, rag_input = await handle_request(message)
+        
+        # Send reply back to client
+        print(f"[Brain] Sending response: {response}")
+        # copy=False hands the packed buffer to zmq without another memcpy
+        await socket.send_multipart(envelope + [encode_message(response, as_json)], copy=False)
+        
+        # 4. Post-Processing: RAG (Summarization + Embedding + Pinecone)
+        # Run in a separate thread to avoid blocking the event loop
+        if rag_input:
+            print(f"[Brain] Triggering background RAG processing for {len(rag_input)} files...")
+            from rag import process_and_store_embeddings
+            rag_thread = threading.Thread(target=process_and_store_embeddings, args=(rag_input,))
+            rag_thread.daemon = True # Daemon thread so it doesn't block shutdown
+            rag_thread.start()
+        
+    except Exception as e:
+        print(f"[Brain] Error: {e}")
+        # Try to send error back to the client
+        try:
+            await socket.send_multipart(envelope + [encode_message({"error": str(e)}, as_json)])
+        except:
+            pass
+
+async def serve():
+    context = zmq.asyncio.Context(io_threads=2)
+    socket = context.socket(zmq.ROUTER)
     socket.bind(IPC_ADDRESS)
     
     print(f"[Brain] Analysis Engine running...")
     print(f"[Brain] Listening on {IPC_ADDRESS}")
     
+    # Keep references so in-flight requests are not garbage collected
+    in_flight = set()
     while True:
-        try:
-            # Wait for next request from client
-            message = socket.recv_json()
-            print(f"[Brain] Received request: {message}")
-            
-            files = message.get("files", [])
-            results = []
-            
-            if not files:
-                # Fallback for single file legacy request (optional, but good for robustness)
-                single_path = message.get("path")
-                if single_path:
-                    files = [single_path]
-            
-            # 1. Extract content for all files
-            file_contents = []
-            for filepath in files:
-                content = extract_content(filepath)
-                file_contents.append({"filepath": filepath, "content": content})
-            print(file_contents)
-            llmClassificationInput = []
-            # 2. Process files (Classification)
-            for item in file_contents:
-                filepath = item["filepath"]
-                content = item["content"]
-                try:
-                    category = classifyUsingHeuristicClassification(filepath, content)
-                    if(category == "Misc" and content and content.strip()!=""):
-                        llmClassificationInput.append({filepath, content})
-                    results.append({"category": category, "path": filepath})
-                    print(f"[Brain] Classified '{os.path.basename(filepath)}' as: {category}")
-                except Exception as e:
-                    print(f"[Brain] Error classifying {filepath}: {e}")
-                    results.append({"category": "Misc", "path": filepath, "error": str(e)})
-            # 3. LLM Classification for uncertain files
-
-            print(llmClassificationInput)
-         
-            if(len(llmClassificationInput)>0):
-                llmBasedClassificationResult=classifyUsingLLMClassification(llmClassificationInput)
-                for res in llmBasedClassificationResult:
-                    filepath=res.get("filepath")
-                    category=res.get("category")
-                    for r in results:
-                        if r["path"]==filepath:
-                            r["category"]=category
-                            print(f"[Brain] LLM Classified '{os.path.basename(filepath)}' as: {category}")
-
-            response = {"results": results}           # Send reply back to client
-            print(f"[Brain] Sending response: {response}")
-            socket.send_json(response)
-            
-            # 4. Post-Processing: RAG (Summarization + Embedding + Pinecone)
-            # Run in a separate thread to avoid blocking the next request loop
-            # We need to combine results with content
-            rag_input = []
-            for res in results:
-                path = res["path"]
-                cat = res["category"]
-                # Find content
-                content = ""
-                for item in file_contents:
-                    if item["filepath"] == path:
-                        content = item["content"]
-                        break
-                
-                if content:
-                    rag_input.append({
-                        "filepath": path,
-                        "content": content,
-                        "category": cat
-                    })
-            
-            if rag_input:
-                print(f"[Brain] Triggering background RAG processing for {len(rag_input)} files...")
-                rag_thread = threading.Thread(target=process_and_store_embeddings, args=(rag_input,))
-                rag_thread.daemon = True # Daemon thread so it doesn't block shutdown
-                rag_thread.start()
-            
-        except KeyboardInterrupt:
-            print("\n[Brain] Shutting down...")
-            break
-        except Exception as e:
-            print(f"[Brain] Error: {e}")
-            # Try to send error back if socket is in a state to send
-            try:
-                socket.send_json({"error": str(e)})
-            except:
-                pass
+        # Wait for next request from client: [routing id, ..., empty delimiter, payload]
+        parts = await socket.recv_multipart()
+        task = asyncio.create_task(serve_request(socket, parts[:-1], parts[-1]))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n[Brain] Shutting down...")
+    finally:
+        _shutdown_ocr_pool()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+import os
+import mmap
+from ocr import ocr_extract
+
+# Content extraction run inside the OCR worker processes. Keep this module free of
+# server, LLM and RAG imports: every worker loads it.
+
+# Readable text files
+text_extensions = {
+    '.txt', '.md', '.csv', '.json', '.xml', '.html', '.css', '.js',
+    '.py', '.cpp', '.h', '.c', '.java', '.sh', '.yaml', '.yml',
+    '.ini', '.conf', '.log'
+}
+
+# OCR candidates
+ocr_extensions = {'.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.pdf'}
+
+# Only the head and tail of large text files are read; keyword matching rarely needs the middle
+TEXT_WINDOW_SIZE = 64 * 1024
+
+def get_extension(filepath):
+    """
+    Lowercased extension of the file name, including the dot ('' if there is none).
+    """
+    name, dot, ext = os.path.basename(filepath).rpartition('.')
+    if not dot or not name:
+        return ""
+    return "." + ext.lower()
+
+def read_text_window(filepath):
+    """
+    Read at most TEXT_WINDOW_SIZE bytes from each end of a text file, undecoded.
+    Large files are mmapped so only the touched pages are loaded.
+    """
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= 2 * TEXT_WINDOW_SIZE:
+            raw = f.read()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                raw = mm[:TEXT_WINDOW_SIZE] + b"\n" + mm[-TEXT_WINDOW_SIZE:]
+    return raw
+
+def extract_content(filepath, page_threads=1):
+    """
+    Extract content from file based on type, as raw (UTF-8) bytes.
+    Decoding is left to consumers that need text, i.e. the LLM and RAG stages.
+    page_threads is the number of threads a multi-page PDF may use for OCR.
+    """
+    if not os.path.exists(filepath):
+        return b""
+        
+    filename = os.path.basename(filepath)
+    ext = get_extension(filename)
+    
+    content = b""
+    try:
+        if ext in text_extensions:
+            content = read_text_window(filepath)
+        elif ext in ocr_extensions:
+            content = ocr_extract(filepath, page_threads)
+    except Exception as e:
+        print(f"[Extract] Error extracting content from {filename}: {e}")
+        
+    return content
@@ -1,6 +1,10 @@
 import dotenv
 import os
-import json
+import orjson
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 dotenv.load_dotenv()
 CATEGORISATION_PROMPT = """
 Classify the following files into one of these categories:
@@ -35,10 +39,10 @@ content: "<extracted_text_content>"
 ...
 }]
 
-Return output as JSON with this schema:
+Return output as JSON with this schema, keyed by each file's exact input "filepath":
 
 {
-  "<file_id>": {
+  "<filepath>": {
     "category": "<one of the categories>",
     "confidence": <number between 0 and 1>,
     "reason": "<short explanation>"
@@ -49,49 +53,134 @@ Files to classify:
 {{FILES_JSON}}
 """
 
+# Files per prompt; keeps each request well inside the model's context window
+LLM_CHUNK_SIZE = 8
+LLM_MAX_CONCURRENCY = 8
+
+# In-process LRU of LLM verdicts keyed by content hash, so repeat files skip the network
+LLM_CACHE_SIZE = 1024
+_classification_cache = OrderedDict()
+_classification_cache_lock = threading.Lock()
+
+def _content_key(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def _cache_get(key):
+    with _classification_cache_lock:
+        verdict = _classification_cache.get(key)
+        if verdict is not None:
+            _classification_cache.move_to_end(key)
+        return verdict
+
+def _cache_put(key, verdict):
+    with _classification_cache_lock:
+        _classification_cache[key] = verdict
+        _classification_cache.move_to_end(key)
+        while len(_classification_cache) > LLM_CACHE_SIZE:
+            _classification_cache.popitem(last=False)
+
+def _parse_classification(content):
+    """
+    Turn one model response into a list of {"filepath", "category"} dicts.
+    Accepts either the prompt's {"<filepath>": {...}} schema or a plain list.
+    """
+    parsed = orjson.loads(content)
+    if isinstance(parsed, list):
+        return [item for item in parsed if isinstance(item, dict) and "filepath" in item]
+    results = []
+    for filepath, info in parsed.items():
+        if isinstance(info, dict):
+            results.append({"filepath": filepath, **info})
+    return results
+
+@lru_cache(maxsize=1)
+def _get_llm(model, temperature, max_output_tokens):
+    """
+    Build the chat client once per process so its HTTP session and credentials are reused.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=model,
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        # Ask for raw JSON so the response needs no markdown fence stripping
+        response_mime_type="application/json",
+    )
+
 def classifyUsingLLMClassification(llmClassificationInput):
     """
     Use a Language Model to classify the files based on its content.
-    Placeholder function for LLM integration.
+    Files whose content was classified earlier in this process are answered from cache.
+    """
+    try:
+        if not isinstance(llmClassificationInput, list):
+            llmClassificationInput = [llmClassificationInput]
+
+        results = []
+        uncached = []
+        keys_by_path = {}
+        for item in llmClassificationInput:
+            # Only well-formed {"filepath", "content"} entries can be cached
+            if not isinstance(item, dict) or not isinstance(item.get("content"), str):
+                uncached.append(item)
+                continue
+            key = _content_key(item["content"])
+            verdict = _cache_get(key)
+            if verdict is not None:
+                results.append({**verdict, "filepath": item.get("filepath")})
+            else:
+                uncached.append(item)
+                keys_by_path[item.get("filepath")] = key
+
+        if uncached:
+            for res in _classify_uncached(uncached):
+                key = keys_by_path.get(res.get("filepath"))
+                if key is not None and res.get("category"):
+                    _cache_put(key, {k: v for k, v in res.items() if k != "filepath"})
+                results.append(res)
+        return results
+    except Exception as e:
+        print(f"[LLM] LLM classification failed: {e}")
+    return []
+
+def _classify_uncached(llmClassificationInput):
+    """
+    Files are sent in chunks of LLM_CHUNK_SIZE as concurrent requests; a malformed
+    response only drops the files of its own chunk.
     """
     try:
         try:
-            from langchain_google_genai import ChatGoogleGenerativeAI
+            import langchain_google_genai  # noqa: F401
         except ImportError:
             print("[LLM] Warning: 'langchain-google-genai' not found. LLM classification disabled.")
             return []
         apikey = os.getenv("GOOGLE_API_KEY")
-        print(apikey)
         if not apikey:
             print("[LLM] Warning: GOOGLE_API_KEY not set. LLM classification disabled.")
             return []
         
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-pro",
-            api_key=apikey,
-            temperature=0.5,
-            max_output_tokens=2000,
-        )
-        
-        # Ensure input is a JSON string
-        if isinstance(llmClassificationInput, list):
-            files_json = json.dumps(llmClassificationInput)
-        else:
-            files_json = str(llmClassificationInput)
-            
-        prompt = CATEGORISATION_PROMPT.replace("{{FILES_JSON}}", files_json)
-        response = llm.invoke(prompt)
-        
-        # Extract content from AIMessage
-        content = response.content if hasattr(response, 'content') else str(response)
-        
-        # Clean up markdown code blocks if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-            
-        return json.loads(content)
+        llm = _get_llm("gemini-2.5-pro", 0.5, 2000)
+
+        prompts = []
+        for i in range(0, len(llmClassificationInput), LLM_CHUNK_SIZE):
+            chunk = llmClassificationInput[i:i + LLM_CHUNK_SIZE]
+            prompts.append(CATEGORISATION_PROMPT.replace("{{FILES_JSON}}", orjson.dumps(chunk).decode()))
+
+        responses = llm.batch(prompts, config={"max_concurrency": LLM_MAX_CONCURRENCY}, return_exceptions=True)
+
+        results = []
+        for response in responses:
+            if isinstance(response, Exception):
+                print(f"[LLM] LLM request failed: {response}")
+                continue
+            # Extract content from AIMessage
+            content = response.content if hasattr(response, 'content') else str(response)
+            try:
+                results.extend(_parse_classification(content))
+            except (ValueError, AttributeError) as e:
+                print(f"[LLM] Could not parse LLM response: {e}")
+        return results
     except Exception as e:
         print(f"[LLM] LLM classification failed: {e}")
     return []
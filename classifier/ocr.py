@@ -1,38 +1,205 @@
 import os
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from PIL import Image
-    import pytesseract
     from pdf2image import convert_from_path
 except ImportError:
-    print("[OCR] Warning: 'Pillow', 'pytesseract', or 'pdf2image' not found. OCR/PDF disabled.")
+    print("[OCR] Warning: 'Pillow' or 'pdf2image' not found. OCR/PDF disabled.")
     Image = None
-    pytesseract = None
     convert_from_path = None
 
-def ocr_extract(filepath):
+# Parallelism comes from the worker processes; stop each Tesseract from also spawning
+# OpenMP threads. Must be set before libtesseract loads (and is inherited by pytesseract).
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# tesserocr keeps the model loaded in-process; pytesseract spawns a tesseract process per image
+try:
+    import tesserocr
+    from tesserocr import PyTessBaseAPI, OEM, PSM
+except ImportError:
+    tesserocr = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+if tesserocr is None and pytesseract is None:
+    print("[OCR] Warning: neither 'tesserocr' nor 'pytesseract' found. OCR disabled.")
+
+# pdf2image's default resolution; more pixels only slow Tesseract down
+PDF_DPI = 200
+# Skip loading the word-list dictionaries; the LSTM model does not need them
+TESSERACT_VARIABLES = {"load_system_dawg": "F", "load_freq_dawg": "F"}
+# LSTM engine only, single uniform block: one layout pass instead of auto-segmentation.
+# The same variables are passed on the command line so pytesseract matches tesserocr.
+TESSERACT_CONFIG = "--oem 1 --psm 6 " + " ".join(f"-c {k}={v}" for k, v in TESSERACT_VARIABLES.items())
+# Files are OCR'd in parallel by a pool of OCR_PROCESSES workers (see brain.extract_all);
+# each request hands the cores its files leave idle to page threads (see _run_ocr)
+OCR_PROCESSES = os.cpu_count() or 1
+
+# Resident tesseract models, reused across calls. A handle is not thread-safe, so each
+# call takes one from the idle list; serial OCR only ever creates one per process.
+_tess_idle = []
+_tess_lock = threading.Lock()
+
+# Persistent OCR results, keyed by SHA-256 of the file bytes
+OCR_CACHE_DIR = os.path.expanduser("~/.magicFolder/ocr_cache")
+OCR_CACHE_PATH = os.path.join(OCR_CACHE_DIR, "ocr.db")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_tesseract_version = None
+
+def _get_tesseract_version():
+    global _tesseract_version
+    if _tesseract_version is None:
+        try:
+            if tesserocr is not None:
+                _tesseract_version = tesserocr.tesseract_version().splitlines()[0]
+            else:
+                _tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _tesseract_version = "unknown"
+    return _tesseract_version
+
+def _cache_fingerprint():
+    """
+    Everything that changes OCR output: backend, Tesseract version and settings.
+    Stored with each cache entry so changing any of them invalidates old results.
+    """
+    backend = "tesserocr" if tesserocr is not None else "pytesseract"
+    variables = ",".join(f"{k}={v}" for k, v in sorted(TESSERACT_VARIABLES.items()))
+    return f"{backend} {_get_tesseract_version()}|dpi={PDF_DPI}|{TESSERACT_CONFIG}|{variables}"
+
+def _file_digest(filepath):
     """
-    Extract text from image or PDF using Tesseract OCR.
+    SHA-256 of the file, streamed in 1 MiB chunks so large PDFs are never fully loaded.
     """
-    if Image is None or pytesseract is None:
-        return ""
-        
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _open_cache():
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    # Several OCR worker processes may share the cache, so wait on locks instead of failing
+    conn = sqlite3.connect(OCR_CACHE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS cache ("
+        "hash TEXT PRIMARY KEY, text TEXT NOT NULL, mtime REAL, size INTEGER, tesseract_version TEXT)"
+    )
+    return conn
+
+def _cache_get(file_hash):
     try:
-        text = ""
-        if filepath.lower().endswith('.pdf'):
-            if convert_from_path is None:
-                print(f"[OCR] PDF OCR skipped for {os.path.basename(filepath)}: pdf2image not available")
-                return ""
-            
-            # Convert PDF to images (first 5 pages to save time)
-            pages = convert_from_path(filepath, first_page=1, last_page=5)
-            for page in pages:
-                text += pytesseract.image_to_string(page) + "\n"
+        conn = _open_cache()
+        try:
+            row = conn.execute(
+                "SELECT text FROM cache WHERE hash=? AND tesseract_version=?",
+                (file_hash, _cache_fingerprint()),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"[OCR] Cache lookup failed: {e}")
+        return None
+
+def _cache_put(file_hash, filepath, text):
+    try:
+        stat = os.stat(filepath)
+        conn = _open_cache()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (hash, text, mtime, size, tesseract_version) VALUES (?, ?, ?, ?, ?)",
+                    (file_hash, text, stat.st_mtime, stat.st_size, _cache_fingerprint()),
+                )
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"[OCR] Cache store failed: {e}")
+
+def _image_to_string(image):
+    if tesserocr is not None:
+        with _tess_lock:
+            api = _tess_idle.pop() if _tess_idle else None
+        if api is None:
+            api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK, oem=OEM.LSTM_ONLY, variables=TESSERACT_VARIABLES)
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            with _tess_lock:
+                _tess_idle.append(api)
+    return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+
+def prefetch_files(filepaths):
+    """
+    Ask the kernel to start reading every file in the batch before OCR begins.
+    Readahead is queued asynchronously for all files at once, so cold reads overlap
+    instead of Poppler/Pillow blocking on them one file at a time. No-op where
+    posix_fadvise is unavailable (e.g. macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for filepath in filepaths:
+        try:
+            fd = os.open(filepath, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+def _run_ocr(filepath, page_threads=1):
+    text = ""
+    if filepath.lower().endswith('.pdf'):
+        # Convert PDF to images (first 5 pages to save time)
+        pages = convert_from_path(filepath, dpi=PDF_DPI, first_page=1, last_page=5, thread_count=page_threads)
+        if page_threads <= 1 or len(pages) <= 1:
+            page_texts = list(map(_image_to_string, pages))
         else:
-            # Image file
-            text = pytesseract.image_to_string(Image.open(filepath))
-            
-        return text
+            # Tesseract runs outside the GIL, so threads are enough to OCR pages in parallel
+            with ThreadPoolExecutor(max_workers=min(page_threads, len(pages))) as executor:
+                page_texts = list(executor.map(_image_to_string, pages))
+        for page_text in page_texts:
+            text += page_text + "\n"
+    else:
+        # Image file
+        text = _image_to_string(Image.open(filepath))
+    return text
+
+def ocr_extract(filepath, page_threads=1):
+    """
+    Extract text from image or PDF using Tesseract OCR, as UTF-8 bytes.
+    Results are cached by file content hash, so unchanged files skip Tesseract.
+    PDF pages are rendered and OCR'd on up to page_threads threads.
+    """
+    if Image is None or (tesserocr is None and pytesseract is None):
+        return b""
+
+    if filepath.lower().endswith('.pdf') and convert_from_path is None:
+        print(f"[OCR] PDF OCR skipped for {os.path.basename(filepath)}: pdf2image not available")
+        return b""
+
+    try:
+        file_hash = _file_digest(filepath)
+        cached = _cache_get(file_hash)
+        if cached is not None:
+            return cached.encode("utf-8")
+
+        text = _run_ocr(filepath, page_threads)
+        _cache_put(file_hash, filepath, text)
+        return text.encode("utf-8")
     except Exception as e:
         print(f"[OCR] OCR failed for {os.path.basename(filepath)}: {e}")
-        return ""
+        return b""
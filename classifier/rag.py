@@ -1,9 +1,16 @@
 import os
 import json
 import time
+import hashlib
+import asyncio
+import threading
+from functools import lru_cache
+import dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 
+dotenv.load_dotenv()
+
 # Prompt for summarization
 SUMMARY_PROMPT = """
 Summarize the following file content in a concise manner (max 150 words).
@@ -16,12 +23,153 @@ Content:
 Summary:
 """
 
+# Pinecone's recommended vectors per upsert request; also used for fetch lookups
+UPSERT_BATCH_SIZE = 100
+UPSERT_POOL_THREADS = 4
+# Summary calls in flight at once, matching the classifier's LLM_MAX_CONCURRENCY
+SUMMARY_MAX_CONCURRENCY = 8
+
+# Keep vectors small: Pinecone bills and transfers every stored byte
+HASH_BYTES = 16
+SUMMARY_METADATA_CHARS = 200
+
+# Clients are built once per process: each one owns an HTTP session and credentials
+@lru_cache(maxsize=1)
+def _get_summary_llm():
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        temperature=0.3,
+    )
+
+@lru_cache(maxsize=1)
+def _get_embeddings():
+    return GoogleGenerativeAIEmbeddings(
+        model="gemini-embedding-001",
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        output_dimensionality=768
+    )
+
+@lru_cache(maxsize=1)
+def _get_pinecone():
+    return Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+
+@lru_cache(maxsize=None)
+def _get_index(index_name):
+    """
+    Return a handle to the Pinecone index, creating the index on first use.
+    """
+    pc = _get_pinecone()
+    
+    # Check if index exists, create if not
+    existing_indexes = [index.name for index in pc.list_indexes()]
+    if index_name not in existing_indexes:
+        print(f"[RAG] Creating Pinecone index: {index_name}")
+        pc.create_index(
+            name=index_name,
+            dimension=768, # Dimension for embedding-001
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud="aws",
+                region="us-east-1"
+            )
+        )
+        # Wait for index to be ready
+        while not pc.describe_index(index_name).status['ready']:
+            time.sleep(1)
+    
+    # pool_threads backs upsert(async_req=True)
+    return pc.Index(index_name, pool_threads=UPSERT_POOL_THREADS)
+
+def _hash128(text):
+    """
+    128-bit BLAKE2b of the text as 32 hex chars.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=HASH_BYTES).hexdigest()
+
+def _vector_id(filepath):
+    return _hash128(filepath)
+
+def _content_id(content):
+    return _hash128(content)
+
+def _delete_legacy_vectors(index, vectors):
+    """
+    Delete the vectors older versions stored under the raw file path as ID, so a
+    file is never returned twice. Deleting IDs that do not exist is a no-op.
+    """
+    legacy_ids = [metadata["filepath"] for _, _, metadata in vectors]
+    for i in range(0, len(legacy_ids), UPSERT_BATCH_SIZE):
+        index.delete(ids=legacy_ids[i:i + UPSERT_BATCH_SIZE])
+
+def _fetch_metadata(index, vector_ids):
+    """
+    Return {vector_id: metadata} for the IDs already present in the index.
+    """
+    existing = {}
+    for i in range(0, len(vector_ids), UPSERT_BATCH_SIZE):
+        response = index.fetch(ids=vector_ids[i:i + UPSERT_BATCH_SIZE])
+        for vector_id, vector in response.vectors.items():
+            existing[vector_id] = vector.metadata or {}
+    return existing
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    """
+    One long-lived event loop for RAG work. The cached async clients bind to the loop
+    they first run on, so every batch must reuse the same loop; the lock keeps
+    concurrent first calls from starting two.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="rag-event-loop")
+            thread.daemon = True
+            thread.start()
+            _event_loop = loop
+        return _event_loop
+
+def _run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+async def _summarize(llm, semaphore, filepath, content):
+    filename = os.path.basename(filepath)
+    try:
+        prompt = SUMMARY_PROMPT.format(filename=filename, content=content[:10000]) # Truncate if too long
+        async with semaphore:
+            response = await llm.ainvoke(prompt)
+        print(f"[RAG] Summarized {filename}")
+        return response.content
+    except Exception as e:
+        print(f"[RAG] Summarization failed for {filename}: {e}")
+        return content[:500] # Fallback to first 500 chars
+
+async def _summarize_and_embed(llm, embeddings_model, items):
+    """
+    Summarize (filepath, content) items concurrently and embed the summaries.
+    At most SUMMARY_MAX_CONCURRENCY summary requests are in flight, so large batches
+    do not trip the API's rate limits.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+    summaries = await asyncio.gather(*[
+        _summarize(llm, semaphore, filepath, content) for filepath, content in items
+    ])
+    embeddings = await embeddings_model.aembed_documents(list(summaries))
+    return summaries, embeddings
+
 def process_and_store_embeddings(file_data_list):
     """
     1. Summarize content using LLM.
     2. Generate embeddings for the summary.
     3. Store in Pinecone DB.
     
+    Vectors are keyed by a 128-bit hash of the file path and carry a hash of the content they were built
+    from: unchanged files are skipped, and files with identical content in one
+    batch share a single summary and embedding.
+    
     Args:
         file_data_list: List of dicts with 'filepath', 'content', 'category'
     """
@@ -39,46 +187,14 @@ def process_and_store_embeddings(file_data_list):
     if not pinecone_api_key:
         print("[RAG] Error: PINECONE_API_KEY not set. Skipping RAG.")
         return
-    print(pinecone_api_key)
+    
     try:
-        # Initialize LLM for summarization
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            api_key=google_api_key,
-            temperature=0.3,
-        )
-        
-        # Initialize Embeddings
-        embeddings_model = GoogleGenerativeAIEmbeddings(
-            model="gemini-embedding-001",
-            google_api_key=google_api_key,
-            output_dimensionality=768
-        )
-        
-        # Initialize Pinecone
-        pc = Pinecone(api_key=pinecone_api_key)
-        
-        # Check if index exists, create if not
-        existing_indexes = [index.name for index in pc.list_indexes()]
-        if pinecone_index_name not in existing_indexes:
-            print(f"[RAG] Creating Pinecone index: {pinecone_index_name}")
-            pc.create_index(
-                name=pinecone_index_name,
-                dimension=768, # Dimension for embedding-001
-                metric="cosine",
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region="us-east-1"
-                )
-            )
-            # Wait for index to be ready
-            while not pc.describe_index(pinecone_index_name).status['ready']:
-                time.sleep(1)
-        
-        index = pc.Index(pinecone_index_name)
-        
-        vectors_to_upsert = []
+        llm = _get_summary_llm()
+        embeddings_model = _get_embeddings()
+        index = _get_index(pinecone_index_name)
         
+        # One vector per path; the content hash tells whether it needs rebuilding
+        pending = {}
         for item in file_data_list:
             filepath = item.get("filepath")
             content = item.get("content")
@@ -87,45 +203,67 @@ def process_and_store_embeddings(file_data_list):
             if not content or len(content.strip()) < 10:
                 print(f"[RAG] Skipping {os.path.basename(filepath)}: Content too short.")
                 continue
-                
-            filename = os.path.basename(filepath)
             
-            # A. Summarize
-            try:
-                prompt = SUMMARY_PROMPT.format(filename=filename, content=content[:10000]) # Truncate if too long
-                response = llm.invoke(prompt)
-                summary = response.content
-                print(f"[RAG] Summarized {filename}")
-            except Exception as e:
-                print(f"[RAG] Summarization failed for {filename}: {e}")
-                summary = content[:500] # Fallback to first 500 chars
-            
-            # B. Embed
-            try:
-                embedding = embeddings_model.embed_query(summary)
-            except Exception as e:
-                print(f"[RAG] Embedding failed for {filename}: {e}")
+            pending[_vector_id(filepath)] = (filepath, content, category, _content_id(content))
+        
+        if not pending:
+            return
+        
+        # Files indexed with the same content need at most a category refresh
+        existing = _fetch_metadata(index, list(pending))
+        unchanged = 0
+        for vector_id, metadata in existing.items():
+            filepath, _, category, content_hash = pending[vector_id]
+            if metadata.get("content_hash") != content_hash:
                 continue
-                
-            # C. Prepare for Pinecone
-            # ID can be filename or hash. Filename is simple but might collide if paths differ.
-            # Using full path hash or just path string as ID (Pinecone IDs must be strings)
-            vector_id = filepath
-            
+            del pending[vector_id]
+            unchanged += 1
+            if metadata.get("category") != category:
+                index.update(id=vector_id, set_metadata={"category": category})
+        if unchanged:
+            print(f"[RAG] {unchanged} files already indexed with unchanged content.")
+        if not pending:
+            return
+        
+        # A + B. Summarize each distinct content concurrently, then embed all summaries in one request
+        by_content = {}
+        for filepath, content, _, content_hash in pending.values():
+            by_content.setdefault(content_hash, (filepath, content))
+        content_hashes = list(by_content)
+        try:
+            summaries, embeddings = _run_async(
+                _summarize_and_embed(llm, embeddings_model, [by_content[h] for h in content_hashes])
+            )
+        except Exception as e:
+            print(f"[RAG] Embedding failed: {e}")
+            return
+        summary_by_content = dict(zip(content_hashes, summaries))
+        embedding_by_content = dict(zip(content_hashes, embeddings))
+        
+        # C. Prepare for Pinecone
+        vectors_to_upsert = []
+        for vector_id, (filepath, _, category, content_hash) in pending.items():
+            # The filename is derived from filepath at read time
             metadata = {
-                "filename": filename,
                 "filepath": filepath,
                 "category": category,
-                "summary": summary,
+                "content_hash": content_hash,
+                "summary": summary_by_content[content_hash][:SUMMARY_METADATA_CHARS],
                 "created_at": time.time()
             }
-            
-            vectors_to_upsert.append((vector_id, embedding, metadata))
-            
-        # D. Upsert to Pinecone
-        if vectors_to_upsert:
-            index.upsert(vectors=vectors_to_upsert)
-            print(f"[RAG] Successfully stored {len(vectors_to_upsert)} vectors in Pinecone.")
+            vectors_to_upsert.append((vector_id, embedding_by_content[content_hash], metadata))
+        
+        # D. Upsert to Pinecone in parallel batches
+        upserts = [
+            index.upsert(vectors=vectors_to_upsert[i:i + UPSERT_BATCH_SIZE], async_req=True)
+            for i in range(0, len(vectors_to_upsert), UPSERT_BATCH_SIZE)
+        ]
+        for upsert in upserts:
+            upsert.get()
+        print(f"[RAG] Successfully stored {len(vectors_to_upsert)} vectors in Pinecone.")
+        
+        # E. Drop the raw-path vectors older versions wrote for the same files
+        _delete_legacy_vectors(index, vectors_to_upsert)
             
     except Exception as e:
 
@@ -1,4 +1,5 @@
 import zmq
+import msgpack
 import sys
 import json
 import os
@@ -16,10 +17,10 @@ def test_classification(filepaths):
     request = {"files": filepaths}
     print(f"Sending request: {json.dumps(request, indent=2)}")
     
-    socket.send_json(request)
+    socket.send(msgpack.packb(request, use_bin_type=True))
     
     # Receive response
-    message = socket.recv_json()
+    message = msgpack.unpackb(socket.recv(), raw=False)
     print(f"Received reply: {json.dumps(message, indent=2)}")
     
     return message
@@ -25,7 +25,7 @@ def main():
         if text:
             print("\n[SUCCESS] Extracted Text:")
             print("-" * 40)
-            print(text)
+            print(text.decode('utf-8', errors='ignore'))
             print("-" * 40)
         else:
             print("\n[WARNING] No text extracted. (Check if OCR dependencies are installed or if the file is empty/unreadable)")
@@ -1,6 +1,7 @@
 import os
 import shutil
 import re
+from concurrent.futures import ThreadPoolExecutor
 from mcp.server.fastmcp import FastMCP
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from pinecone import Pinecone
@@ -15,6 +16,18 @@ mcp = FastMCP("MagicFolder Search")
 # Configuration
 SEARCH_RESULTS_ROOT = os.path.expanduser("~/MagicFolder_Search")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "magic-folder-index")
+MIN_MATCH_SCORE = 0.4 # Adjust based on testing
+SYMLINK_WORKERS = 16
+
+def _link_if_exists(filepath, target_link):
+    """Symlink filepath to target_link if the source still exists."""
+    if not os.path.exists(filepath):
+        return False
+    try:
+        os.symlink(filepath, target_link)
+    except OSError:
+        return False
+    return True
 
 def get_safe_filename(s):
     """Sanitize string to be used as a filename."""
@@ -70,30 +83,35 @@ def search_magic_folder(query: str) -> str:
         os.makedirs(result_dir)
         
         # 4. Symlink Files
-        count = 0
-        files_found = []
+        # Filter on score before touching the filesystem
+        good = [m for m in results['matches'] if m['score'] >= MIN_MATCH_SCORE]
+        filepaths = [m['metadata'].get('filepath') for m in good]
+        # The same file can match more than once; link it only once
+        filepaths = list(dict.fromkeys(fp for fp in filepaths if fp))
         
-        for match in results['matches']:
-            # Score threshold (optional)
-            if match['score'] < 0.4: # Adjust based on testing
-                continue
-                
-            filepath = match['metadata'].get('filepath')
-            filename = match['metadata'].get('filename')
-            
-            if not filepath or not os.path.exists(filepath):
-                continue
-                
-            # Create symlink
-            # Handle duplicate filenames in results
-            target_link = os.path.join(result_dir, filename)
-            if os.path.exists(target_link):
+        # Handle duplicate filenames in results: the first file keeps its name, later
+        # ones get the first "_<n>" suffix no other result already uses
+        used_names = {os.path.basename(fp) for fp in filepaths}
+        taken = set()
+        targets = []
+        for filepath in filepaths:
+            filename = os.path.basename(filepath)
+            if filename in taken:
                 base, ext = os.path.splitext(filename)
-                target_link = os.path.join(result_dir, f"{base}_{count}{ext}")
-            
-            os.symlink(filepath, target_link)
-            files_found.append(filename)
-            count += 1
+                n = 1
+                while f"{base}_{n}{ext}" in used_names:
+                    n += 1
+                filename = f"{base}_{n}{ext}"
+                used_names.add(filename)
+            taken.add(filename)
+            targets.append(os.path.join(result_dir, filename))
+        
+        # os.symlink and os.path.exists release the GIL, so threads overlap the syscalls
+        with ThreadPoolExecutor(max_workers=SYMLINK_WORKERS) as executor:
+            linked = list(executor.map(_link_if_exists, filepaths, targets))
+        
+        files_found = [os.path.basename(target) for target, ok in zip(targets, linked) if ok]
+        count = len(files_found)
             
         if count == 0:
             return f"Found matches but files were missing or score was too low. (Top match score: {results['matches'][0]['score']})"